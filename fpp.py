@@ -1,17 +1,47 @@
 import collections
+import contextlib
+import functools
+import hashlib
 import inspect
+import io
+import itertools
+import logging
+import mmap
+import os
+import pickle
 import textwrap
 import pathlib
-
-import inflection
+import re
+import shutil
+import sqlite3
 
 import clang
 import clang.cindex
 from clang.cindex import CursorKind, TokenKind
 
 
+logger = logging.getLogger(__name__)
+
+_UNDERSCORE_ACRONYM_RE = re.compile(r'([A-Z]+)([A-Z][a-z])')
+_UNDERSCORE_WORD_RE = re.compile(r'([a-z\d])([A-Z])')
+
+
+# names are converted over and over again, so cache the results
+@functools.lru_cache(maxsize=8192)
+def _underscore(word):
+    # same as inflection.underscore, with the patterns compiled up front
+    word = _UNDERSCORE_ACRONYM_RE.sub(r'\1_\2', word)
+    word = _UNDERSCORE_WORD_RE.sub(r'\1_\2', word)
+    return word.replace('-', '_').lower()
+
+
 def debug(cursor):
-    for attr in dir(cursor):
+    # evaluates every property and zero-argument method of the cursor, which
+    # is expensive; only enabled with FPP_DEBUG set in the environment
+    if not (__debug__ and os.environ.get('FPP_DEBUG')):
+        return
+
+    for attr in vars(type(cursor)):
         try:
             val = getattr(cursor, attr)
         except Exception:
@@ -26,14 +56,14 @@ def debug(cursor):
             print(attr, val)
 
 
-def find_classes(cursor):
-    return list(find_kind(cursor, CursorKind.CLASS_DECL))
+def find_classes(cursor, *, index=None):
+    return list(find_kind(cursor, CursorKind.CLASS_DECL, index=index))
 
 
-def find_methods(cursor):
-    return (list(find_kind(cursor, CursorKind.CONSTRUCTOR)) +
-            list(find_kind(cursor, CursorKind.DESTRUCTOR)) +
-            list(find_kind(cursor, CursorKind.CXX_METHOD))
+def find_methods(cursor, *, index=None):
+    return (list(find_kind(cursor, CursorKind.CONSTRUCTOR, index=index)) +
+            list(find_kind(cursor, CursorKind.DESTRUCTOR, index=index)) +
+            list(find_kind(cursor, CursorKind.CXX_METHOD, index=index))
             )
 
 
@@ -48,12 +78,15 @@ def get_method_info(cursor):
 
 
 def print_ast(cursor, *, depth=0):
-    print(' '.join((depth * '    ',
-                    str(cursor.kind),
-                    str(cursor.spelling),
-                    )))
-    for child in cursor.get_children():
-        print_ast(child, depth=depth + 1)
+    stack = [(cursor, depth)]
+    while stack:
+        cursor, depth = stack.pop()
+        print(' '.join((depth * '    ',
+                        str(cursor.kind),
+                        str(cursor.spelling),
+                        )))
+        stack.extend((child, depth + 1)
+                     for child in reversed(list(cursor.get_children())))
 
 
 def iterate(cursor):
@@ -61,16 +94,50 @@ def iterate(cursor):
     while stack:
         cursor = stack.popleft()
         yield cursor
-        stack.extend(list(cursor.get_children()))
+        stack.extend(cursor.get_children())
+
+
+def walk_once(cursor, kinds=None):
+    # yield (kind, cursor) for cursors of the given kinds, in iterate()'s
+    # breadth-first order: a class's own methods come before those of the
+    # classes nested in it, which is the order they are written out in
+    for c in iterate(cursor):
+        kind = c.kind
+        if kinds is None or kind in kinds:
+            yield kind, c
+
+
+def build_kind_index(cursor, kinds=None):
+    # walk the tree once, grouping cursors by kind for find_kind(index=...)
+    index = collections.defaultdict(list)
+    for kind, c in walk_once(cursor, kinds):
+        index[kind].append(c)
+    return index
+
+
+def build_spelling_index(cursor):
+    # walk the tree once, grouping cursors by spelling
+    index = collections.defaultdict(list)
+    for c in iterate(cursor):
+        index[c.spelling].append(c)
+    return index
 
 
-def find_by_spelling(cursor, spelling):
+def find_by_spelling(cursor, spelling, *, index=None):
+    if index is not None:
+        yield from index.get(spelling, [])
+        return
+
     for c in iterate(cursor):
         if c.spelling == spelling:
-            yield cursor
+            yield c
 
 
-def find_kind(cursor, kind):
+def find_kind(cursor, kind, *, index=None):
+    if index is not None:
+        yield from index.get(kind, [])
+        return
+
     for c in iterate(cursor):
         if c.kind == kind:
             yield c
@@ -85,24 +152,34 @@ class Base:
     def parse(self, cursor):
         ...
 
+    def __getstate__(self):
+        # libclang cursors and types can't be pickled; everything derived
+        # from them has been stored on the instance by now
+        state = self.__dict__.copy()
+        state['cursor'] = None
+        return state
+
 
 class Type(Base):
     def parse(self, cursor):
         self.c_name = cursor.spelling
         self.name = self.get_python_type_name(cursor)
 
-    def get_python_type_name(self, cursor):
-        while cursor.get_pointee().spelling:
-            cursor = cursor.get_pointee()
-        while cursor.get_class_type().spelling:
-            cursor = cursor.get_class_type()
-
-        ret = cursor.spelling
-
-        for strip_type in ['std::shared_ptr', 'const ']:
-            ret = ret.replace(strip_type, '')
+    # type spelling -> spelling with pointers/member pointers stripped
+    _base_spellings = {}
 
-        return remove_known_namespaces(ret).strip('<>').replace('::', '.')
+    def get_python_type_name(self, cursor):
+        spelling = cursor.spelling
+        base_spelling = self._base_spellings.get(spelling)
+        if base_spelling is None:
+            while cursor.get_pointee().spelling:
+                cursor = cursor.get_pointee()
+            while cursor.get_class_type().spelling:
+                cursor = cursor.get_class_type()
+            base_spelling = cursor.spelling
+            self._base_spellings[spelling] = base_spelling
+
+        return _python_type_name(base_spelling, tuple(project_namespaces))
 
     def __repr__(self):
         return f'{self.name}'
@@ -121,9 +198,9 @@ class Argument(Base):
     def parse(self, cursor):
         self.type = Type(cursor.type, parent=self)
         self.c_name = cursor.spelling
-        self.name = inflection.underscore(self.c_name)
+        self.name = _underscore(self.c_name)
         if not self.name:
-            self.name = inflection.underscore(
+            self.name = _underscore(
                 self.type.name.split('.')[-1]
             )
 
@@ -132,21 +209,34 @@ class Argument(Base):
 
 
 class Method(Base):
+    special_names = {
+        'operator=': '__operator_equal__',  # incorrect
+        'operator==': '__eq__',
+        'operator!=': '__ne__',
+        'operator>': '__gt__',
+        'operator>=': '__ge__',
+        'operator<': '__lt__',
+        'operator<=': '__le__',
+    }
+
+    punctuation_map = {
+        '++': ' += 1 #increment# ',
+        '--': ' -= 1 #decrement# ',
+        ',': ', ',
+        '=': ' = ',
+        '::': '.',
+        '->': '.',
+        ';': '\n',
+        '{': '\n',
+        '}': '\n',
+    }
+
     def parse(self, cursor):
         self.c_name = cursor.spelling
         can_rename = self.c_name not in self.parent.python_base_attrs
-        special_names = {
-            'operator=': '__operator_equal__',  # incorrect
-            'operator==': '__eq__',
-            'operator!=': '__ne__',
-            'operator>': '__gt__',
-            'operator>=': '__ge__',
-            'operator<': '__lt__',
-            'operator<=': '__le__',
-        }
         if can_rename:
-            self.name = inflection.underscore(
-                special_names.get(cursor.spelling, cursor.spelling)
+            self.name = _underscore(
+                self.special_names.get(cursor.spelling, cursor.spelling)
             )
         else:
             self.name = cursor.spelling
@@ -154,23 +244,30 @@ class Method(Base):
         self.args = [Argument(c, parent=self)
                      for c in cursor.get_arguments()]
 
-        self.saw_python_objects = set(
-            arg.type for arg in self.args
-            if arg.type in self.parent.python_base_namespace
-        )
+        python_base_names = self.parent.python_base_names
+        self.saw_python_objects = {
+            arg.type.name for arg in self.args
+            if arg.type.name in python_base_names
+        }
         self.has_retval = (cursor.result_type.spelling != 'void')
         self.result_type = Type(cursor.result_type, parent=self)
         self.comments = self.build_comments(cursor)
         if not cursor.is_static_method():
             self.args.insert(0, SelfArgument(None, parent=self))
 
-        self.identifier_map = self.parent.identifier_map.copy()
-        self.identifier_map.update(**{
-            attr: Identifier(attr, f'self.{attr}', None)
-            for attr in self.parent.python_base_attrs
-        })
+        # a snapshot: only fields and the methods declared before this one
+        # are in the class map at this point
+        self.identifier_map = {
+            **self.parent.identifier_map,
+            **self.parent.base_attr_identifiers,
+        }
         self._source = None
 
+    def __getstate__(self):
+        # generate the source while the cursor is still around
+        self.source
+        return super().__getstate__()
+
     @property
     def type(self):
         return self.result_type
@@ -193,11 +290,14 @@ class Method(Base):
             self._source_body = ''
             return '...'
 
-        with open(defn.location.file.name, 'rt') as f:
-            lines = f.read().splitlines()
-
-        start, stop = defn.extent.start.line, defn.extent.end.line
-        source = '\n'.join(lines[start - 1:stop])
+        contents, line_offsets = _load_file(defn.location.file.name)
+        # clamped like the list slice lines[start - 1:stop], in case the
+        # file has changed since it was parsed
+        last_line = len(line_offsets) - 1
+        start = min(defn.extent.start.line - 1, last_line)
+        stop = min(defn.extent.end.line, last_line)
+        source = contents[line_offsets[start]:line_offsets[stop]].decode()
+        source = '\n'.join(source.splitlines())
 
         reference_source = textwrap.dedent(source)
         self._reference_source = reference_source
@@ -215,25 +315,14 @@ class Method(Base):
     def convert_tokenized_source(self, cursor):
         source = []
         identifier_map = self.identifier_map.copy()
-        identifier_map.update(**{
+        identifier_map.update({
             arg.c_name: Identifier(arg.c_name, arg.name, arg)
             for arg in self.args
         })
 
         identifier_map['this'] = Identifier('this', 'self', self)
 
-        punctuation_map = {
-            '++': ' += 1 #increment# ',
-            '--': ' -= 1 #decrement# ',
-            ',': ', ',
-            '=': ' = ',
-            '::': '.',
-            '->': '.',
-            ';': '\n',
-            '{': '\n',
-            '}': '\n',
-        }
-
+        punctuation_map = self.punctuation_map
         insert_at_newline = ''
 
         def newline():
@@ -242,21 +331,24 @@ class Method(Base):
                 source.append(insert_at_newline)
                 insert_at_newline = ''
 
-            source.append('\n' + ' ' * (braces * 4))
+            source.append(_newline_indent(braces))
 
         def skip_to_cursor(cursor):
-            while tokens and tokens[0].cursor.hash != cursor.hash:
-                tokens.popleft()
+            nonlocal pos
+            cursor_hash = cursor.hash
+            while pos < num_tokens and cursor_hashes[pos] != cursor_hash:
+                pos += 1
 
-        def keyword_handler(token, keyword):
+        def keyword_handler(idx):
             nonlocal insert_at_newline
             nonlocal braces
+            keyword = spellings[idx]
             if keyword == 'for':
-                cursor = token.cursor
+                cursor = token_cursors[idx]
                 # all tokens consumed by the statement:
                 # token.cursor.get_tokens()
                 if cursor.kind == CursorKind.CXX_FOR_RANGE_STMT:
-                    var, expr, contents = list(cursor.get_children())
+                    var, expr, contents = cursor.get_children()
                     source.append('for {} in ({}):'.format(
                         self.convert_tokenized_source(var),
                         self.convert_tokenized_source(expr).strip(),
@@ -264,7 +356,7 @@ class Method(Base):
                     newline()
                     skip_to_cursor(contents)
                 elif cursor.kind == CursorKind.FOR_STMT:
-                    init, check, iteration, contents = list(cursor.get_children())
+                    init, check, iteration, contents = cursor.get_children()
                     newline()
                     source.append(self.convert_tokenized_source(init))
                     newline()
@@ -285,86 +377,114 @@ class Method(Base):
             else:
                 source.append(f'{keyword} ')
 
-        def check_identifier(identifier, context):
+        def check_identifier(parts, context):
+            # parts: the dotted identifier, already split on '.'
+            if len(parts) == 1:
+                # the common case: a plain name
+                entry = context.get(parts[0])
+                return entry.name if entry is not None else parts[0]
+
+            identifier = '.'.join(parts)
             if identifier in context:
                 identifier = context[identifier].name
-            elif '.' in identifier:
-                prefix, suffix = identifier.split('.', 1)
+            else:
+                prefix, *suffix = parts
                 if prefix in context:
                     prefix = context[prefix]
+                    suffix = '.'.join(suffix)
                     if (prefix.obj is not None and
                             hasattr(prefix.obj, 'identifier_map')):
-                        print('doublesuffix!', prefix, suffix, prefix.obj.name,
-                              prefix.obj.identifier_map.keys())
-                        suffix = check_identifier(suffix,
+                        logger.debug('doublesuffix! %s %s %s %s', prefix,
+                                     suffix, prefix.obj.name,
+                                     prefix.obj.identifier_map.keys())
+                        suffix = check_identifier(parts[1:],
                                                   prefix.obj.identifier_map)
                     identifier = f'{prefix}.{suffix}'
             return identifier
 
-        def lookahead_identifiers(tokens):
-            identifier = ''
-            ate = []
-            for token in tokens:
-                spelling = token.spelling
-                if token.kind == TokenKind.IDENTIFIER:
-                    identifier += spelling
-                    ate.append(token)
-                elif token.kind == TokenKind.PUNCTUATION:
+        def lookahead_identifiers(start):
+            parts = ['']
+            ate = 0
+            for idx in range(start, num_tokens):
+                kind = kinds[idx]
+                spelling = spellings[idx]
+                if kind == TokenKind.IDENTIFIER:
+                    parts[-1] += spelling
+                    ate += 1
+                elif kind == TokenKind.PUNCTUATION:
                     if spelling in ('.', '->', '::'):
-                        identifier += '.'
-                        ate.append(token)
+                        parts.append('')
+                        ate += 1
                     else:
                         break
                 else:
                     break
 
-            identifier = check_identifier(identifier, identifier_map)
+            identifier = check_identifier(parts, identifier_map)
             return ate, identifier
 
-        def consume(token):
-            nonlocal source
+        def comment_handler(idx):
+            spelling = spellings[idx].lstrip(' /')
+            newline()
+            source.append(f'# {spelling}')
+            newline()
+
+        def identifier_handler(idx):
+            nonlocal pos
+            ate, identifier = lookahead_identifiers(idx)
+            pos += ate - 1
+            if identifier in self.parent.python_base_names:
+                self.saw_python_objects.add(identifier)
+            source.append(identifier_map.get(identifier, identifier))
+
+        def punctuation_handler(idx):
             nonlocal braces
-            nonlocal insert_at_newline
-
-            spelling = token.spelling
-            kind = token.kind
-            if kind == TokenKind.COMMENT:
-                spelling = spelling.lstrip(' /')
-                newline()
-                source.append(f'# {spelling}')
+            spelling = spellings[idx]
+            if spelling == '{':
+                braces += 1
+                if braces == 0:
+                    source.clear()
+            elif spelling == '}':
+                braces -= 1
+
+            spelling = translated[idx]
+            if spelling == '\n':
                 newline()
-            elif kind == TokenKind.IDENTIFIER:
-                ate, identifier = lookahead_identifiers([token, *tokens])
-                for skip in ate[1:]:
-                    tokens.popleft()
-                if identifier in self.parent.python_base_namespace:
-                    self.saw_python_objects.add(identifier)
-                source.append(identifier_map.get(identifier, identifier))
-            elif kind == TokenKind.KEYWORD:
-                keyword_handler(token, spelling)
-            elif kind == TokenKind.PUNCTUATION:
-                if spelling == '{':
-                    braces += 1
-                    if braces == 0:
-                        source = []
-                elif spelling == '}':
-                    braces -= 1
-
-                spelling = punctuation_map.get(spelling, spelling)
-                if spelling == '\n':
-                    newline()
-                else:
-                    source.append(spelling)
-                # TODO: &&, ||, << ...
             else:
                 source.append(spelling)
+            # TODO: &&, ||, << ...
+
+        def literal_handler(idx):
+            source.append(spellings[idx])
+
+        handlers = {
+            TokenKind.COMMENT: comment_handler,
+            TokenKind.IDENTIFIER: identifier_handler,
+            TokenKind.KEYWORD: keyword_handler,
+            TokenKind.PUNCTUATION: punctuation_handler,
+        }
 
         braces = -1  # hack to remove function header
-        tokens = collections.deque(list(cursor.get_tokens()))
-        while tokens:
-            token = tokens.popleft()
-            cursor = token.cursor
-            consume(token)
+        # libclang token properties each cross the FFI boundary; read them
+        # all once up front into parallel lists indexed by token position
+        tokens = list(cursor.get_tokens())
+        kinds = [token.kind for token in tokens]
+        spellings = [token.spelling for token in tokens]
+        token_cursors = [token.cursor for token in tokens]
+        cursor_hashes = [token_cursor.hash for token_cursor in token_cursors]
+        translated = [
+            punctuation_map.get(spelling, spelling)
+            if kind == TokenKind.PUNCTUATION else spelling
+            for kind, spelling in zip(kinds, spellings)
+        ]
+
+        token_handlers = [handlers.get(kind, literal_handler) for kind in kinds]
+
+        num_tokens = len(tokens)
+        pos = 0
+        while pos < num_tokens:
+            pos += 1
+            token_handlers[pos - 1](pos - 1)
 
         return ''.join(str(s) for s in source)
 
@@ -398,19 +518,22 @@ class Method(Base):
         else:
             return textwrap.indent('\n'.join(comments), ' ' * 4)
 
-    def __repr__(self):
+    def write_to(self, buf, *, prefix=''):
         arg_str = ', '.join(repr(arg) for arg in self.args)
-        source = textwrap.indent(self.source, ' ' * 4)
         if self.has_retval:
             return_annotation = f' -> {self.result_type.name}'
         else:
             return_annotation = ''
-        return f"""\
+        _write_indented(
+            buf, f'\ndef {self.name}({arg_str}){return_annotation}:\n',
+            prefix)
+        _write_indented(buf, f'{self.comments}\n', prefix)
+        _write_indented(buf, f'{self.source}\n', prefix + ' ' * 4)
 
-def {self.name}({arg_str}){return_annotation}:
-{self.comments}
-{source}
-"""
+    def __repr__(self):
+        buf = io.StringIO()
+        self.write_to(buf)
+        return buf.getvalue()
 
 
 class BaseClass(Base):
@@ -442,7 +565,7 @@ class Identifier:
 class Field(Base):
     def parse(self, cursor):
         self.c_name = cursor.spelling
-        self.name = inflection.underscore(self.c_name)
+        self.name = _underscore(self.c_name)
         if self.name.startswith('m_'):
             # apply advanced heuristics
             self.name = self.name[1:]
@@ -454,9 +577,17 @@ class Class(BaseClass):
     skip_methods = ['tr', 'tr_utf8', 'qt_static_metacall', 'qt_metacast',
                     'qt_metacall', 'metaObject',
                     ]
+    index_kinds = frozenset({
+        CursorKind.CXX_BASE_SPECIFIER,
+        CursorKind.FIELD_DECL,
+        CursorKind.CONSTRUCTOR,
+        CursorKind.DESTRUCTOR,
+        CursorKind.CXX_METHOD,
+    })
 
     def __init__(self, cursor, *, python_base_namespace=None, parent=None):
         self.python_base_namespace = python_base_namespace
+        self.python_base_names = frozenset(python_base_namespace)
         super().__init__(cursor, parent=parent)
 
         self.saw_python_objects = set()
@@ -468,10 +599,12 @@ class Class(BaseClass):
 
     def parse(self, cursor):
         super().parse(cursor)
+        index = build_kind_index(cursor, kinds=self.index_kinds)
 
         self.bases = [
             BaseClass(c).name
-            for c in find_kind(cursor, CursorKind.CXX_BASE_SPECIFIER)
+            for c in find_kind(cursor, CursorKind.CXX_BASE_SPECIFIER,
+                               index=index)
             if c.spelling != cursor.spelling
         ]
 
@@ -481,14 +614,17 @@ class Class(BaseClass):
             if cls in self.python_base_namespace
         ]
 
-        self.python_base_attrs = set(
-            sum((dir(cls) for cls in self.python_bases),
-                [])
-        )
+        self.python_base_attrs = frozenset(itertools.chain.from_iterable(
+            _dir_cached(cls) for cls in self.python_bases
+        ))
+        self.base_attr_identifiers = {
+            attr: Identifier(attr, f'self.{attr}', None)
+            for attr in self.python_base_attrs
+        }
 
         self.fields = {
             c.spelling: Field(c, parent=self)
-            for c in find_kind(cursor, CursorKind.FIELD_DECL)
+            for c in find_kind(cursor, CursorKind.FIELD_DECL, index=index)
         }
 
         self.identifier_map = {
@@ -497,7 +633,7 @@ class Class(BaseClass):
         }
 
         self.methods = []
-        for method_cursor in find_methods(cursor):
+        for method_cursor in find_methods(cursor, index=index):
             # intentionally not a list comprehension - really, we need to
             # preprocess to find these names first...
             method = Method(method_cursor, parent=self)
@@ -512,36 +648,123 @@ class Class(BaseClass):
             if method.name not in self.skip_methods or method.source_body:
                 yield method
 
-    def __repr__(self):
-        methods = '\n'.join(repr(m) for m in self.methods_to_output)
-        if not methods:
-            methods = '...'
-
-        methods = textwrap.indent(methods, ' ' * 4)
+    def write_to(self, buf):
         bases = '({})'.format(', '.join(self.bases)) if self.bases else ''
         initializer = ''
         del_method = ''
         ret = [f'class {self.name}{bases}:',
                initializer,
-               del_method,
-               methods]
-        return '\n'.join(line for line in ret
-                         if line)
+               del_method]
+        buf.write('\n'.join(line for line in ret
+                            if line))
+        buf.write('\n')
+
+        prefix = ' ' * 4
+        methods = list(self.methods_to_output)
+        if not methods:
+            _write_indented(buf, '...', prefix)
+
+        for idx, method in enumerate(methods):
+            if idx > 0:
+                buf.write('\n')
+            method.write_to(buf, prefix=prefix)
+
+    def __repr__(self):
+        buf = io.StringIO()
+        self.write_to(buf)
+        return buf.getvalue()
+
+
+@functools.lru_cache(maxsize=None)
+def _newline_indent(depth):
+    return '\n' + ' ' * (depth * 4)
+
+
+def _write_indented(buf, text, prefix):
+    # textwrap.indent(), but straight into buf
+    for line in text.splitlines(True):
+        if line.strip():
+            buf.write(prefix)
+        buf.write(line)
 
 
 def remove_known_namespaces(name):
-    for namespace in project_namespaces:
-        if name.startswith(namespace):
-            name = name[len(namespace):]
-    return name
+    return _remove_namespaces(name, tuple(project_namespaces))
+
+
+def _load_file(name):
+    # keyed on size and mtime as well, to notice files that change between
+    # runs.  That can miss a same-size rewrite within the filesystem's
+    # timestamp resolution, so parse() also drops every mapping when it
+    # rewrites combined_source.cpp
+    stat = os.stat(name)
+    return _map_file(name, stat.st_size, stat.st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=64)
+def _map_file(name, size, mtime):
+    # map each source file once; return it along with the byte offset at
+    # which each line starts (plus a final end-of-file offset)
+    with open(name, 'rb') as f:
+        try:
+            contents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            contents = b''
+
+    line_offsets = [0]
+    offset = contents.find(b'\n')
+    while offset != -1:
+        line_offsets.append(offset + 1)
+        offset = contents.find(b'\n', offset + 1)
+
+    if line_offsets[-1] != len(contents):
+        line_offsets.append(len(contents))
+    return contents, line_offsets
+
+
+@functools.lru_cache(maxsize=4096)
+def _remove_namespaces(name, namespaces):
+    return name[_namespaces_re(namespaces).match(name).end():]
+
+
+@functools.lru_cache(maxsize=None)
+def _namespaces_re(namespaces):
+    # one optional group per namespace, in order, which strips the same
+    # prefixes as checking each namespace in turn with startswith()
+    return re.compile(''.join(f'(?:{re.escape(namespace)})?'
+                              for namespace in namespaces))
+
+
+@functools.lru_cache(maxsize=None)
+def _python_type_name(spelling, namespaces):
+    for strip_type in ['std::shared_ptr', 'const ']:
+        spelling = spelling.replace(strip_type, '')
+
+    spelling = _remove_namespaces(spelling, namespaces)
+    return spelling.strip('<>').replace('::', '.')
+
+
+@functools.lru_cache(maxsize=None)
+def _dir_cached(obj):
+    return frozenset(dir(obj))
 
 
 def build_namespace(modules):
+    # callers are free to modify the result; hand out a copy
+    return dict(_build_namespace(tuple(modules)))
+
+
+@functools.lru_cache(maxsize=None)
+def _build_namespace(modules):
     namespace = {}
     for module in modules:
-        for attr in dir(module):
+        for attr in sorted(_dir_cached(module)):
+            # the first module providing a class wins, as with imports
+            if attr in namespace:
+                continue
             cls = getattr(module, attr)
-            if inspect.isclass(cls):
+            if isinstance(cls, type):
                 namespace[attr] = cls
     return namespace
 
@@ -555,12 +778,86 @@ def prune_classes(classes):
             clsdict[cls.name] = cls
         else:
             current = clsdict[cls.name]
+            # on a tie the first one found stays, so this depends on the
+            # breadth-first order of find_classes()
             if len(cls.methods) > len(current.methods):
                 clsdict[cls.name] = cls
     return clsdict
 
 
-def parse(source_path, args=None, index=None, python_base_namespace=None):
+def _libclang_version():
+    # clang.cindex doesn't wrap clang_getClangVersion; it returns a CXString
+    get_version = clang.cindex.conf.lib.clang_getClangVersion
+    get_version.restype = clang.cindex._CXString
+    get_version.errcheck = clang.cindex._CXString.from_result
+    return get_version()
+
+
+def _cache_key(combined, args, python_base_namespace):
+    key = hashlib.blake2b(digest_size=16)
+    key.update(pathlib.Path(__file__).read_bytes())
+    # a different libclang can produce a different AST from the same sources
+    key.update(_libclang_version().encode())
+    key.update(clang.cindex.conf.get_filename().encode())
+    key.update(pathlib.Path(combined).read_bytes())
+    key.update(repr(list(args)).encode())
+    key.update(repr(project_namespaces).encode())
+    for name, cls in sorted(python_base_namespace.items()):
+        # base class attributes decide which names are left alone and
+        # which become self.<attr>
+        key.update(repr((name, sorted(_dir_cached(cls)))).encode())
+    return key.hexdigest()
+
+
+def _file_digest(filename):
+    try:
+        contents = pathlib.Path(filename).read_bytes()
+    except OSError:
+        return None
+    return hashlib.blake2b(contents, digest_size=16).digest()
+
+
+def _open_cache(cache_path):
+    db = sqlite3.connect(str(cache_path))
+    db.execute('CREATE TABLE IF NOT EXISTS classes '
+               '(key TEXT PRIMARY KEY, includes BLOB, blob BLOB)')
+    return db
+
+
+def load_cached(cache_path, key):
+    with contextlib.closing(_open_cache(cache_path)) as db:
+        row = db.execute('SELECT includes, blob FROM classes WHERE key = ?',
+                         (key, )).fetchone()
+    if row is None:
+        return None
+
+    includes, blob = row
+    # headers aren't part of the key; the entry is only good if none of
+    # the files included when it was stored have changed since
+    for filename, digest in pickle.loads(includes):
+        if _file_digest(filename) != digest:
+            logger.info('Cache entry is stale: %s changed', filename)
+            return None
+    return pickle.loads(blob)
+
+
+def store_cached(cache_path, key, clsdict, includes=(), *, keep=8):
+    includes = [(filename, _file_digest(filename)) for filename in includes]
+    includes = pickle.dumps(includes, protocol=pickle.HIGHEST_PROTOCOL)
+    blob = pickle.dumps(clsdict, protocol=pickle.HIGHEST_PROTOCOL)
+    with contextlib.closing(_open_cache(cache_path)) as db:
+        with db:
+            db.execute('INSERT OR REPLACE INTO classes VALUES (?, ?, ?)',
+                       (key, includes, blob))
+            # each insert gets a larger rowid than the rest; only keep the
+            # most recently stored entries
+            db.execute('DELETE FROM classes WHERE rowid NOT IN '
+                       '(SELECT rowid FROM classes '
+                       'ORDER BY rowid DESC LIMIT ?)', (keep, ))
+
+
+def parse(source_path, args=None, index=None, python_base_namespace=None,
+          cache_path=None):
     if python_base_namespace is None:
         python_base_namespace = {}
 
@@ -594,21 +891,34 @@ def parse(source_path, args=None, index=None, python_base_namespace=None):
 
 
     # NOTE: This is _probably_ all bad form when it comes to the clang API...
-    combined_source = []
-
-    print('Source path:', source_path)
+    logger.info('Source path: %s', source_path)
     source_path = pathlib.Path(source_path)
-    for source_file in source_path.glob('*.cpp'):
-        print('Adding', source_file)
-        with open(source_file, 'rt') as f:
-            combined_source.append(f.read())
-
-    if not combined_source:
+    source_files = list(source_path.glob('*.cpp'))
+    if not source_files:
         raise RuntimeError('No cpp files found')
 
     combined = pathlib.Path('.') / 'combined_source.cpp'
-    with open(combined, 'wt') as f:
-        f.write('\n'.join(combined_source))
+    with open(combined, 'wb') as combined_file:
+        for idx, source_file in enumerate(source_files):
+            logger.info('Adding %s', source_file)
+            if idx > 0:
+                combined_file.write(b'\n')
+            with open(source_file, 'rb') as f:
+                shutil.copyfileobj(f, combined_file, length=1 << 20)
+    _map_file.cache_clear()
+
+    if cache_path is not None:
+        cache_key = _cache_key(combined, args, python_base_namespace)
+        try:
+            clsdict = load_cached(cache_path, cache_key)
+        except (sqlite3.Error, pickle.PickleError) as ex:
+            logger.warning('Unable to load cached classes from %s: %s',
+                           cache_path, ex)
+            clsdict = None
+
+        if clsdict is not None:
+            logger.info('Loaded classes from cache %s', cache_path)
+            return clsdict
 
     if index is None:
         index = clang.cindex.Index.create()
@@ -627,76 +937,92 @@ def parse(source_path, args=None, index=None, python_base_namespace=None):
 
     clsdict = prune_classes(all_classes)
 
+    if cache_path is not None:
+        includes = sorted({inclusion.include.name
+                           for inclusion in tu.get_includes()})
+        try:
+            store_cached(cache_path, cache_key, clsdict, includes)
+        except (sqlite3.Error, pickle.PickleError) as ex:
+            logger.warning('Unable to cache classes in %s: %s',
+                           cache_path, ex)
+
     return clsdict
 
 
+# runs of blank lines are collapsed to a single one in the output
+_BLANKS_RE = re.compile(r'\n{3,}')
+
+
+def _import_modules(python_base_modules):
+    # name -> (position, module name) for the first module providing it
+    import_modules = {}
+    for position, module in enumerate(python_base_modules):
+        modname = module.__name__
+        for attr in _dir_cached(module):
+            import_modules.setdefault(attr, (position, modname))
+    return import_modules
+
+
+def _import_lines(cls, import_modules):
+    if not cls.saw_python_objects:
+        return []
+
+    per_module = {}
+    for import_ in cls.saw_python_objects:
+        if import_ in import_modules:
+            per_module.setdefault(import_modules[import_], []).append(import_)
+
+    lines = []
+    for (_, modname), per_module_imports in sorted(per_module.items()):
+        parenthesize = len(per_module_imports) > 6
+        per_module_imports = ', '.join(sorted(per_module_imports))
+        if parenthesize:
+            per_module_imports = f'({per_module_imports})'
+
+        lines.append(
+            f'from {modname} import {per_module_imports}\n'
+        )
+    return lines
+
+
 def write_combined_output(clsdict, output_path, *, python_base_modules=None):
     if python_base_modules is None:
         python_base_modules = []
     output_path = pathlib.Path(output_path)
-    with open(output_path, 'wt') as f:
-        for name, cls in sorted(clsdict.items()):
-            imports = set(cls.saw_python_objects)
-            for module in python_base_modules:
-                per_module_imports = [
-                    import_ for import_ in imports
-                    if import_ in dir(module)
-                ]
-                for import_ in per_module_imports:
-                    imports.remove(import_)
-
-                if per_module_imports:
-                    per_module_imports = ', '.join(sorted(per_module_imports))
-                    if per_module_imports.count(',') > 5:
-                        per_module_imports = f'({per_module_imports})'
-
-                    print(
-                        f'from {module.__name__} import {per_module_imports}',
-                        file=f
-                    )
-
-        for name, cls in sorted(clsdict.items()):
-            output = str(cls)
-            while '\n\n\n' in output:
-                output = output.replace('\n\n\n', '\n\n')
-
-            print(output, file=f)
+    import_modules = _import_modules(python_base_modules)
+    parts = []
+    for name, cls in sorted(clsdict.items()):
+        parts.extend(_import_lines(cls, import_modules))
+
+    for name, cls in sorted(clsdict.items()):
+        output = str(cls)
+        output = _BLANKS_RE.sub('\n\n', output)
+        parts.append(output + '\n')
+
+    output_path.write_text(''.join(parts))
 
 
 def write_output(clsdict, output_path, *, python_base_modules=None):
     if python_base_modules is None:
         python_base_modules = []
     output_path = pathlib.Path(output_path)
+    import_modules = _import_modules(python_base_modules)
+    written = {}
     for name, cls in sorted(clsdict.items()):
-        print(f'{name:30} methods: {len(cls.methods)}\t'
-              f'fields {len(cls.fields)}\t'
-              f'imports {len(cls.saw_python_objects)}')
-        with open(output_path / f'{inflection.underscore(name)}.py',
-                  'wt') as f:
-            imports = set(cls.saw_python_objects)
-            for module in python_base_modules:
-                per_module_imports = [
-                    import_ for import_ in imports
-                    if import_ in dir(module)
-                ]
-                for import_ in per_module_imports:
-                    imports.remove(import_)
-
-                if per_module_imports:
-                    per_module_imports = ', '.join(sorted(per_module_imports))
-                    if per_module_imports.count(',') > 5:
-                        per_module_imports = f'({per_module_imports})'
-
-                    print(
-                        f'from {module.__name__} import {per_module_imports}',
-                        file=f
-                    )
-
-            output = str(cls)
-            while '\n\n\n' in output:
-                output = output.replace('\n\n\n', '\n\n')
-
-            print(output, file=f)
+        logger.info('%-30s methods: %d\tfields %d\timports %d', name,
+                    len(cls.methods), len(cls.fields),
+                    len(cls.saw_python_objects))
+        parts = _import_lines(cls, import_modules)
+        output = str(cls)
+        output = _BLANKS_RE.sub('\n\n', output)
+        parts.append(output + '\n')
+        class_path = output_path / f'{_underscore(name)}.py'
+        if class_path in written:
+            # e.g., URLLoader and UrlLoader; the last one in sorted order wins
+            logger.warning('%s overwrites %s in %s', name,
+                           written[class_path], class_path)
+        written[class_path] = name
+        class_path.write_text(''.join(parts))
 
 
 # TODO
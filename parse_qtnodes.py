@@ -1,3 +1,4 @@
+import logging
 import os
 import pathlib
 import fpp
@@ -16,12 +17,18 @@ python_base_modules = (
     QtWebChannel, QtWebSockets, QtWidgets, QtXml, QtXmlPatterns, Qt
 )
 
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+
 # TODO
 fpp.project_namespaces = ['QtNodes::', 'QtNodes.', 'std::', 'std.']
 
 source_path = pathlib.Path.home() / 'Repos' / 'nodeeditor' / 'src'
+cache_path = pathlib.Path.home() / '.cache' / 'firstpasspiler'
+os.makedirs(cache_path, exist_ok=True)
+
 python_namespace = build_namespace(python_base_modules)
-base_clsdict = parse(source_path, python_base_namespace=python_namespace)
+base_clsdict = parse(source_path, python_base_namespace=python_namespace,
+                     cache_path=cache_path / 'classes.sqlite')
 
 os.makedirs('output', exist_ok=True)
 write_output(base_clsdict, 'output', python_base_modules=python_base_modules)